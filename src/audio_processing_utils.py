@@ -1,9 +1,10 @@
-import io
 import logging
+import struct
 
 import numpy as np
 from scipy.signal import resample
-import scipy.io.wavfile as wav
+from typing import Final
+
 from logger import Logger
 
 class AudioProcessingUtils:
@@ -18,22 +19,68 @@ class AudioProcessingUtils:
             AudioProcessingUtils._logger.error(f"Resampling failed: {e}")
             raise RuntimeError("Resampling failed.") from e
 
-    @staticmethod
-    def to_wav(audio: np.ndarray, sampling_rate: int) -> io.BytesIO:
-        try:
-            buffer = io.BytesIO()
-            wav.write(buffer, sampling_rate, audio)
-            buffer.seek(0)
-            return buffer
-        except Exception as e:
-            AudioProcessingUtils._logger.error(f"WAV conversion failed: {e}")
-            raise RuntimeError("WAV conversion failed.") from e
 
-    @staticmethod
-    def float32_to_int16(audio: np.ndarray) -> np.ndarray:
+class WavEncoder:
+    """Encodes float32 mono audio into a reusable, preallocated 16-bit PCM WAV buffer.
+
+    The header is written once at construction; each call only converts samples in place into the
+    data section, so the returned buffer is overwritten by the next call to `encode`.
+    """
+    WAV_HEADER_SIZE: Final[int] = 44
+    BYTES_PER_SAMPLE: Final[int] = 2
+
+    def __init__(self, sampling_rate: int, clip_duration_in_seconds: float) -> None:
+        if not isinstance(sampling_rate, int) or sampling_rate <= 0:
+            raise ValueError("Sampling rate must be a positive integer.")
+        if clip_duration_in_seconds <= 0:
+            raise ValueError("Clip duration must be positive.")
+
+        self._logger: logging.Logger = Logger().get_logger()
+        self._sampling_rate: int = sampling_rate
+        self._frames: int = int(clip_duration_in_seconds * sampling_rate)
+        if self._frames < 1:
+            raise ValueError("Clip duration must cover at least one sample.")
+
+        data_size = self._frames * WavEncoder.BYTES_PER_SAMPLE
+        self._buffer: bytearray = bytearray(WavEncoder.WAV_HEADER_SIZE + data_size)
+        self._write_header(data_size)
+
+        # Writable int16 view over the data section of the WAV buffer
+        self._pcm: np.ndarray = np.frombuffer(
+            memoryview(self._buffer)[WavEncoder.WAV_HEADER_SIZE:], dtype='<i2'
+        )
+        self._scratch: np.ndarray = np.empty(self._frames, dtype=np.float32)
+
+    @property
+    def sampling_rate(self) -> int:
+        return self._sampling_rate
+
+    def _write_header(self, data_size: int) -> None:
+        byte_rate = self._sampling_rate * WavEncoder.BYTES_PER_SAMPLE
+        struct.pack_into(
+            '<4sI4s4sIHHIIHH4sI', self._buffer, 0,
+            b'RIFF', WavEncoder.WAV_HEADER_SIZE - 8 + data_size, b'WAVE',
+            b'fmt ', 16, 1, 1, self._sampling_rate, byte_rate, WavEncoder.BYTES_PER_SAMPLE,
+            WavEncoder.BYTES_PER_SAMPLE * 8,
+            b'data', data_size
+        )
+
+    def encode(self, audio: np.ndarray, source_sampling_rate: int) -> bytearray:
+        """Encodes the last clip duration of `audio`; shorter input is padded with trailing silence."""
         try:
-            audio = np.clip(audio, -1.0, 1.0)  # Avoid overflow
-            return np.int16(audio * 32767)
+            if source_sampling_rate != self._sampling_rate:
+                audio = AudioProcessingUtils.resample(audio, source_sampling_rate, self._sampling_rate)
+
+            clip = audio[-self._frames:]
+            samples = len(clip)
+            scratch = self._scratch[:samples]
+
+            np.clip(clip, -1.0, 1.0, out=scratch)  # Avoid overflow
+            np.multiply(scratch, 32767, out=scratch)
+            np.copyto(self._pcm[:samples], scratch, casting='unsafe')
+            self._pcm[samples:] = 0
+
+            return self._buffer
         except Exception as e:
-            AudioProcessingUtils._logger.error(f"Conversion to int16 failed: {e}")
-            raise RuntimeError("float32 to int16 conversion failed.") from e
\ No newline at end of file
+            self._logger.error(f"WAV encoding failed: {e}")
+            raise RuntimeError("WAV encoding failed.") from e
@@ -0,0 +1,75 @@
+import logging
+import os
+import resource
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass
+from typing import Final, Optional
+
+from logger import Logger
+
+
+@dataclass(frozen=True)
+class MemorySample:
+    rss_bytes: int
+    allocated_blocks: int
+    traced_current_bytes: Optional[int] = None
+    traced_peak_bytes: Optional[int] = None
+
+
+class MemoryMonitor:
+    STATM_PATH: Final[str] = '/proc/self/statm'
+    BYTES_PER_MB: Final[int] = 1024 * 1024
+
+    def __init__(self, interval_in_seconds: float, trace_allocations: bool = False) -> None:
+        if interval_in_seconds <= 0:
+            raise ValueError("Interval must be positive.")
+
+        self._logger: logging.Logger = Logger().get_logger()
+        self._interval_in_seconds: float = interval_in_seconds
+
+        if trace_allocations and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+        self._baseline: MemorySample = self.sample()
+        self._last_report_time: float = time.monotonic()
+
+    @staticmethod
+    def get_rss_bytes() -> int:
+        try:
+            with open(MemoryMonitor.STATM_PATH, 'r') as statm:
+                resident_pages = int(statm.read().split()[1])
+            return resident_pages * os.sysconf('SC_PAGE_SIZE')
+        except (OSError, ValueError, IndexError):
+            # Not on Linux, fall back to the peak resident set size (reported in KB on Linux, bytes on macOS)
+            max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            return max_rss if sys.platform == 'darwin' else max_rss * 1024
+
+    @staticmethod
+    def sample() -> MemorySample:
+        traced_current, traced_peak = tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else (None, None)
+        return MemorySample(
+            rss_bytes=MemoryMonitor.get_rss_bytes(),
+            allocated_blocks=sys.getallocatedblocks(),
+            traced_current_bytes=traced_current,
+            traced_peak_bytes=traced_peak
+        )
+
+    def report_if_due(self) -> None:
+        now = time.monotonic()
+        if now - self._last_report_time >= self._interval_in_seconds:
+            self._last_report_time = now
+            self.report()
+
+    def report(self) -> MemorySample:
+        current = self.sample()
+        rss_growth = current.rss_bytes - self._baseline.rss_bytes
+        message = (f"Memory report: RSS {current.rss_bytes / MemoryMonitor.BYTES_PER_MB:.1f} MB "
+                   f"({rss_growth / MemoryMonitor.BYTES_PER_MB:+.1f} MB since start), "
+                   f"{current.allocated_blocks} allocated blocks")
+        if current.traced_current_bytes is not None:
+            message += (f", traced {current.traced_current_bytes / MemoryMonitor.BYTES_PER_MB:.1f} MB "
+                        f"(peak {current.traced_peak_bytes / MemoryMonitor.BYTES_PER_MB:.1f} MB)")
+        self._logger.info(f"{message}.")
+        return current
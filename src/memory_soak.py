@@ -0,0 +1,328 @@
+import argparse
+import asyncio
+import datetime
+import logging
+import sys
+import tracemalloc
+from typing import Any, Dict, Final, List, Optional
+
+import numpy as np
+
+from config import Config
+from logger import Logger
+from memory_monitor import MemoryMonitor, MemorySample
+from now_playing import NowPlaying
+from service.music_detection_service import MusicDetectionService
+from service.song_identify_service import SongIdentifyService
+from service.spotify_service import SpotifyService
+from state_manager import StateManager
+
+
+class SimulatedClock:
+    """Clock advanced by the recordings, so time-based state transitions follow the simulated listening time."""
+
+    def __init__(self) -> None:
+        self._now: datetime.datetime = datetime.datetime(2000, 1, 1)
+
+    def now(self) -> datetime.datetime:
+        return self._now
+
+    def advance(self, seconds: float) -> None:
+        self._now += datetime.timedelta(seconds=seconds)
+
+
+class SyntheticAudioRecordingService:
+    """Alternates a synthetic chord, runout-groove crackle and low-level noise, like a record being flipped."""
+    RUNOUT_NOISE_LEVEL: Final[float] = 0.05
+    SILENCE_NOISE_LEVEL: Final[float] = 0.01
+
+    def __init__(self, sampling_rate: int, music_recordings: int, runout_recordings: int, silence_recordings: int,
+                 clock: SimulatedClock) -> None:
+        self._sampling_rate: int = sampling_rate
+        self._music_recordings: int = music_recordings
+        self._runout_recordings: int = runout_recordings
+        self._silence_recordings: int = silence_recordings
+        self._clock: SimulatedClock = clock
+        self._recording_count: int = 0
+        self._rng: np.random.Generator = np.random.default_rng(seed=0)
+
+    def record(self, duration: float) -> np.ndarray:
+        samples = int(duration * self._sampling_rate)
+        position = self._recording_count % (self._music_recordings + self._runout_recordings
+                                            + self._silence_recordings)
+        is_music = position < self._music_recordings
+        is_runout = not is_music and position < self._music_recordings + self._runout_recordings
+        self._recording_count += 1
+        self._clock.advance(duration)
+
+        # A fresh array per call, as sounddevice returns
+        noise_level = SyntheticAudioRecordingService.RUNOUT_NOISE_LEVEL if is_runout \
+            else SyntheticAudioRecordingService.SILENCE_NOISE_LEVEL
+        audio = self._rng.normal(0.0, noise_level, samples).astype(np.float32)
+        if is_music:
+            t = np.arange(samples, dtype=np.float32) / self._sampling_rate
+            audio += 0.3 * np.sin(2 * np.pi * 220.0 * t) + 0.2 * np.sin(2 * np.pi * 277.18 * t)
+        return audio
+
+
+class FakeYamnetInterpreter:
+    """Stands in for the YAMNet TFLite interpreter, scoring 'Music' per frame from the frame's RMS energy.
+
+    Scores go through the real MusicDetectionService, so its scoring, smoothing and hysteresis are exercised.
+    """
+    CLASS_COUNT: Final[int] = 521
+    MUSIC_CLASS_INDEX: Final[int] = 132
+    SILENCE_CLASS_INDEX: Final[int] = 494
+    FRAME_HOP: Final[int] = 7680  # 0.48 s at 16 kHz, half of a 0.96 s frame
+    RMS_TO_SCORE: Final[float] = 3.0
+    SILENT_SCORE: Final[float] = 0.1
+
+    def __init__(self) -> None:
+        self._waveform: Optional[np.ndarray] = None
+        self._scores: Optional[np.ndarray] = None
+
+    def get_input_details(self) -> List[dict]:
+        return [{'index': 0}]
+
+    def get_output_details(self) -> List[dict]:
+        return [{'index': 1}]
+
+    def resize_tensor_input(self, input_index: int, tensor_size: List[int], strict: bool = False) -> None:
+        pass
+
+    def allocate_tensors(self) -> None:
+        pass
+
+    def set_tensor(self, tensor_index: int, value: np.ndarray) -> None:
+        self._waveform = value
+
+    def invoke(self) -> None:
+        # A frame spans two hops, so its energy is the mean energy of two neighbouring hops
+        hops = len(self._waveform) // FakeYamnetInterpreter.FRAME_HOP
+        hop_energy = np.mean(np.square(
+            self._waveform[:hops * FakeYamnetInterpreter.FRAME_HOP].reshape(hops, FakeYamnetInterpreter.FRAME_HOP)
+        ), axis=1)
+        frame_energy = (hop_energy[:-1] + hop_energy[1:]) / 2
+        music_scores = np.clip(np.sqrt(frame_energy) * FakeYamnetInterpreter.RMS_TO_SCORE, 0.0, 1.0)
+        self._scores = np.full((len(frame_energy), FakeYamnetInterpreter.CLASS_COUNT), 0.01, dtype=np.float32)
+        self._scores[:, FakeYamnetInterpreter.MUSIC_CLASS_INDEX] = music_scores
+        # Quiet frames are topped by 'Silence', anything louder, including runout crackle, by 'Music'
+        self._scores[:, FakeYamnetInterpreter.SILENCE_CLASS_INDEX] = np.where(
+            music_scores < FakeYamnetInterpreter.SILENT_SCORE, 0.5, 0.01
+        )
+
+    def get_tensor(self, tensor_index: int) -> np.ndarray:
+        return self._scores
+
+
+class OfflineShazam:
+    """Replaces the Shazam API call, cycling through a fixed set of songs every few lookups."""
+    SONG_COUNT: Final[int] = 3
+
+    def __init__(self, lookups_per_song: int) -> None:
+        self._lookups_per_song: int = lookups_per_song
+        self._lookup_count: int = 0
+
+    async def recognize(self, data: bytearray) -> Dict[str, Any]:
+        await asyncio.sleep(0)
+        if not data:
+            return {}
+        song = (self._lookup_count // self._lookups_per_song) % OfflineShazam.SONG_COUNT
+        self._lookup_count += 1
+        # A freshly built response, shaped like the Shazam API result
+        return {'track': {
+            'title': f"Song {song}",
+            'subtitle': f"Artist {song}",
+            'images': {'coverart': f"https://example.com/{song}.jpg"},
+            'sections': [{'metadata': [{'title': 'Album', 'text': f"Album {song}"}]}],
+        }}
+
+
+class OfflineSongIdentifyService(SongIdentifyService):
+    """The real identify service and its event loop, with only the network lookup replaced."""
+
+    def __init__(self, lookups_per_song: int) -> None:
+        super().__init__()
+        self._shazam = OfflineShazam(lookups_per_song=lookups_per_song)
+
+
+class LocalSpotifyClient:
+    """Local player standing in for the spotipy client, returning freshly built response dictionaries."""
+    DEVICE_ID: Final[str] = "soak-device"
+    TRACK_DURATION_MS: Final[int] = 240_000
+
+    def __init__(self, device_name: str, clock: SimulatedClock) -> None:
+        self._device_name: str = device_name
+        self._clock: SimulatedClock = clock
+        self._track_uri: Optional[str] = None
+        self._started_at: datetime.datetime = clock.now()
+        self._paused_progress_ms: Optional[int] = None
+
+    def _get_progress_ms(self) -> int:
+        if self._paused_progress_ms is not None:
+            return self._paused_progress_ms
+        elapsed_ms = int((self._clock.now() - self._started_at).total_seconds() * 1000)
+        return min(elapsed_ms, LocalSpotifyClient.TRACK_DURATION_MS)
+
+    def current_playback(self) -> Optional[dict]:
+        if self._track_uri is None:
+            return None
+        return {
+            'device': {'id': LocalSpotifyClient.DEVICE_ID, 'name': self._device_name},
+            'is_playing': self._paused_progress_ms is None,
+            'progress_ms': self._get_progress_ms(),
+            'shuffle_state': False,
+            'repeat_state': 'off',
+            'item': {'uri': self._track_uri, 'duration_ms': LocalSpotifyClient.TRACK_DURATION_MS},
+        }
+
+    def devices(self) -> dict:
+        return {'devices': [{'id': LocalSpotifyClient.DEVICE_ID, 'name': self._device_name}]}
+
+    def search(self, q: str, type: str, limit: int) -> dict:
+        return {'tracks': {'items': [{
+            'name': q,
+            'uri': f"spotify:track:{abs(hash(q))}",
+            'track_number': 3,
+            'album': {'album_type': 'album', 'uri': f"spotify:album:{abs(hash(q))}"},
+        }]}}
+
+    def start_playback(self, device_id=None, context_uri=None, uris=None, offset=None, position_ms=None) -> None:
+        self._track_uri = uris[0] if uris else f"{context_uri}:{offset['position']}"
+        self._started_at = self._clock.now() - datetime.timedelta(milliseconds=position_ms or 0)
+        self._paused_progress_ms = None
+
+    def pause_playback(self, device_id=None) -> None:
+        self._paused_progress_ms = self._get_progress_ms()
+
+    def transfer_playback(self, device_id, force_play=True) -> None:
+        pass
+
+    def shuffle(self, state) -> None:
+        pass
+
+    def repeat(self, state) -> None:
+        pass
+
+    def next_track(self) -> None:
+        self._started_at = self._clock.now()
+
+
+class LocalSpotifyService(SpotifyService):
+    """The real Spotify service, talking to a local player instead of the Spotify Web API."""
+
+    def __init__(self, device_name: str, clock: SimulatedClock) -> None:
+        super().__init__()
+        self.sp = LocalSpotifyClient(device_name=device_name, clock=clock)
+
+
+def _format_sample(label: str, sample: MemorySample, baseline: MemorySample) -> str:
+    return (f"{label}: RSS {sample.rss_bytes / MemoryMonitor.BYTES_PER_MB:.1f} MB "
+            f"({(sample.rss_bytes - baseline.rss_bytes) / MemoryMonitor.BYTES_PER_MB:+.2f} MB), "
+            f"traced {sample.traced_current_bytes / MemoryMonitor.BYTES_PER_MB:.2f} MB "
+            f"({(sample.traced_current_bytes - baseline.traced_current_bytes) / MemoryMonitor.BYTES_PER_MB:+.2f} MB), "
+            f"{sample.allocated_blocks} allocated blocks ({sample.allocated_blocks - baseline.allocated_blocks:+d})")
+
+
+def _parse_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Drive NowPlaying with synthetic audio for hours of simulated time, with the Shazam and Spotify "
+                    "services running against local stand-ins, failing when memory grows beyond the budget."
+    )
+    parser.add_argument('--hours', type=float, default=24.0, help="Simulated listening time.")
+    parser.add_argument('--warmup-iterations', type=int, default=60,
+                        help="Loop iterations to run before taking the baseline.")
+    parser.add_argument('--sample-every', type=int, default=360, help="Loop iterations between memory samples.")
+    parser.add_argument('--rss-budget-mb', type=float, default=8.0, help="Allowed RSS growth after warm-up.")
+    parser.add_argument('--traced-budget-mb', type=float, default=2.0,
+                        help="Allowed growth of memory traced by tracemalloc after warm-up.")
+    parser.add_argument('--blocks-per-iteration-budget', type=float, default=1.0,
+                        help="Allowed growth of allocated blocks per loop iteration after warm-up.")
+    parser.add_argument('--use-model', action='store_true',
+                        help="Use the real YAMNet interpreter instead of the energy-based stand-in interpreter.")
+    args = parser.parse_args()
+
+    if args.warmup_iterations < 1:
+        parser.error("--warmup-iterations must be at least 1.")
+    if args.sample_every < 1:
+        parser.error("--sample-every must be at least 1.")
+    if args.hours * 3600 / NowPlaying.AUDIO_RECORDING_DURATION_IN_SECONDS <= args.warmup_iterations:
+        parser.error(f"--hours must cover more than {args.warmup_iterations} warm-up iterations.")
+    return args
+
+
+def main() -> int:
+    args = _parse_arguments()
+    Logger().get_logger().setLevel(logging.WARNING)  # Keep the soak output readable
+    tracemalloc.start(10)
+
+    recording_duration = NowPlaying.AUDIO_RECORDING_DURATION_IN_SECONDS
+    clock = SimulatedClock()
+    music_detection_service = MusicDetectionService(
+        audio_duration_in_seconds=recording_duration,
+        interpreter=None if args.use_model else FakeYamnetInterpreter()
+    )
+    now_playing = NowPlaying(
+        audio_recording_service=SyntheticAudioRecordingService(
+            sampling_rate=NowPlaying.AUDIO_DEVICE_SAMPLING_RATE,
+            # 15 minutes of music, 30 seconds of runout groove and 2 minutes of silence
+            music_recordings=90,
+            runout_recordings=3,
+            silence_recordings=12,
+            clock=clock
+        ),
+        music_detection_service=music_detection_service,
+        song_identify_service=OfflineSongIdentifyService(lookups_per_song=24),
+        spotify_service=LocalSpotifyService(
+            device_name=Config().get_config()['spotify']['device_name'],
+            clock=clock
+        ),
+        state_manager=StateManager(clock=clock.now)
+    )
+
+    iterations = int(args.hours * 3600 / recording_duration)
+
+    baseline: Optional[MemorySample] = None
+    baseline_snapshot: Optional[tracemalloc.Snapshot] = None
+    for iteration in range(1, iterations + 1):
+        now_playing.run_once()
+
+        if iteration == args.warmup_iterations:
+            # Snapshot first, so the blocks it holds on to are part of the baseline rather than counted as growth
+            baseline_snapshot = tracemalloc.take_snapshot()
+            baseline = MemoryMonitor.sample()
+            print(_format_sample("Baseline", baseline, baseline))
+        elif baseline and iteration % args.sample_every == 0:
+            simulated_hours = iteration * recording_duration / 3600
+            print(_format_sample(f"{simulated_hours:6.2f} h", MemoryMonitor.sample(), baseline))
+
+    final = MemoryMonitor.sample()
+    final_snapshot = tracemalloc.take_snapshot()
+    measured_iterations = iterations - args.warmup_iterations
+    print(_format_sample("Final", final, baseline))
+
+    print("Top allocation growth since baseline:")
+    for statistic in final_snapshot.compare_to(baseline_snapshot, 'lineno')[:10]:
+        print(f"  {statistic}")
+
+    failures = []
+    rss_growth_mb = (final.rss_bytes - baseline.rss_bytes) / MemoryMonitor.BYTES_PER_MB
+    if rss_growth_mb > args.rss_budget_mb:
+        failures.append(f"RSS grew {rss_growth_mb:.2f} MB, budget is {args.rss_budget_mb:.2f} MB")
+    traced_growth_mb = (final.traced_current_bytes - baseline.traced_current_bytes) / MemoryMonitor.BYTES_PER_MB
+    if traced_growth_mb > args.traced_budget_mb:
+        failures.append(f"Traced memory grew {traced_growth_mb:.2f} MB, budget is {args.traced_budget_mb:.2f} MB")
+    blocks_per_iteration = (final.allocated_blocks - baseline.allocated_blocks) / measured_iterations
+    if blocks_per_iteration > args.blocks_per_iteration_budget:
+        failures.append(f"Allocated blocks grew {blocks_per_iteration:.2f} per iteration, "
+                        f"budget is {args.blocks_per_iteration_budget:.2f}")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if not failures:
+        print(f"PASS: {measured_iterations} iterations within the memory budget.")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
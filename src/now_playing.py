@@ -10,9 +10,10 @@ from config import Config
 from state_manager import StateManager, PlayState
 
 from service.song_identify_service import SongIdentifyService, SongInfo
-from audio_processing_utils import AudioProcessingUtils
+from audio_processing_utils import AudioProcessingUtils, WavEncoder
+from memory_monitor import MemoryMonitor
 from service.audio_recording_service import AudioRecordingService
-from service.music_detection_service import MusicDetectionService
+from service.music_detection_service import MusicDetectionService, MusicDetection
 from service.spotify_service import SpotifyService
 
 
@@ -22,45 +23,86 @@ class NowPlaying:
     AUDIO_RECORDING_DURATION_IN_SECONDS: Final[int] = 10
     SUPPORTED_SAMPLING_RATE_BY_MUSIC_DETECTION_MODEL: Final[int] = 16000
     NO_MUSIC_THRESHOLD: Final[int] = 4
-
-    def __init__(self) -> None:
+    DEFAULT_IDENTIFY_SAMPLING_RATE: Final[int] = 16000
+    DEFAULT_IDENTIFY_CLIP_DURATION_IN_SECONDS: Final[float] = 10
+    DEFAULT_MEMORY_REPORT_INTERVAL_IN_SECONDS: Final[int] = 3600
+
+    def __init__(self,
+                 audio_recording_service: Optional[AudioRecordingService] = None,
+                 music_detection_service: Optional[MusicDetectionService] = None,
+                 song_identify_service: Optional[SongIdentifyService] = None,
+                 spotify_service: Optional[SpotifyService] = None,
+                 state_manager: Optional[StateManager] = None) -> None:
         signal.signal(signal.SIGTERM, self._handle_exit)  # System or process termination
         signal.signal(signal.SIGINT, self._handle_exit)  # Ctrl+C termination
 
         self._config: dict = Config().get_config()
         self._logger: logging.Logger = Logger().get_logger()
 
-        self._audio_recording_service: AudioRecordingService = AudioRecordingService(
+        # Services can be injected, e.g. by the memory soak harness; by default the real services are used
+        self._audio_recording_service: AudioRecordingService = audio_recording_service or AudioRecordingService(
             sampling_rate=NowPlaying.AUDIO_DEVICE_SAMPLING_RATE,
             channels=NowPlaying.AUDIO_DEVICE_NUMBER_OF_CHANNELS
         )
-        self._music_detection_service: MusicDetectionService = MusicDetectionService(
+        self._music_detection_service: MusicDetectionService = music_detection_service or MusicDetectionService(
             audio_duration_in_seconds=NowPlaying.AUDIO_RECORDING_DURATION_IN_SECONDS
         )
-        self._song_identify_service: SongIdentifyService = SongIdentifyService()
-        self._spotify_service: SpotifyService = SpotifyService()
-        self._state_manager: StateManager = StateManager()
+        self._song_identify_service: SongIdentifyService = song_identify_service or SongIdentifyService()
+        identify_config = self._config.get('identify') or {}
+        identify_sampling_rate = identify_config.get('sampling_rate', NowPlaying.DEFAULT_IDENTIFY_SAMPLING_RATE)
+        if not isinstance(identify_sampling_rate, int) or identify_sampling_rate <= 0:
+            raise ValueError(f"Config 'identify.sampling_rate' must be a positive integer, "
+                             f"got '{identify_sampling_rate}'.")
+        identify_clip_duration = identify_config.get(
+            'clip_duration_in_seconds', NowPlaying.DEFAULT_IDENTIFY_CLIP_DURATION_IN_SECONDS
+        )
+        # Only the latest recording is identified, a longer clip would be padded with silence
+        if identify_clip_duration > NowPlaying.AUDIO_RECORDING_DURATION_IN_SECONDS:
+            raise ValueError(f"Config 'identify.clip_duration_in_seconds' must not exceed "
+                             f"{NowPlaying.AUDIO_RECORDING_DURATION_IN_SECONDS} seconds.")
+        self._wav_encoder: WavEncoder = WavEncoder(
+            sampling_rate=identify_sampling_rate,
+            clip_duration_in_seconds=identify_clip_duration
+        )
+        self._spotify_service: SpotifyService = spotify_service or SpotifyService()
+        self._state_manager: StateManager = state_manager or StateManager()
 
         self.set_idle_state()
-        self._audio_buffer: Optional[np.ndarray] = None
-
         self._no_music_counter: int = 0
 
+        memory_report_config = self._config.get('memory_report')
+        self._memory_monitor: Optional[MemoryMonitor] = MemoryMonitor(
+            interval_in_seconds=memory_report_config.get(
+                'interval_in_seconds', NowPlaying.DEFAULT_MEMORY_REPORT_INTERVAL_IN_SECONDS
+            ),
+            trace_allocations=memory_report_config.get('trace_allocations', False)
+        ) if memory_report_config else None
+
     def run(self) -> None:
         while True:
-            try:
-                audio, is_music_detected = self._record_audio_and_detect_music()
+            self.run_once()
+
+            if self._memory_monitor:
+                self._memory_monitor.report_if_due()
 
-                if is_music_detected:
-                    self._handle_music_detected(audio)
-                else:
-                    self._handle_no_music_detected()
+    def run_once(self) -> None:
+        try:
+            audio, sampling_rate, music_detection = self._record_audio_and_detect_music()
 
-            except Exception as e:
-                self._logger.error(f"Error occurred: {e}")
-                self._logger.error(traceback.format_exc())
+            if music_detection == MusicDetection.MUSIC:
+                self._handle_music_detected(audio, sampling_rate)
+            elif music_detection == MusicDetection.NO_MUSIC:
+                self._handle_no_music_detected()
+            else:
+                # Held as music by the hysteresis only, skip identifying a window that may well be silent
+                self._logger.debug("Music fading, keeping current state without identifying.")
+                self.stop_song_within_limit()
 
-    def _record_audio_and_detect_music(self) -> Tuple[np.ndarray, bool]:
+        except Exception as e:
+            self._logger.error(f"Error occurred: {e}")
+            self._logger.error(traceback.format_exc())
+
+    def _record_audio_and_detect_music(self) -> Tuple[np.ndarray, int, MusicDetection]:
         audio = self._audio_recording_service.record(
             duration=NowPlaying.AUDIO_RECORDING_DURATION_IN_SECONDS
         )
@@ -69,22 +111,23 @@ class NowPlaying:
             source_sampling_rate=NowPlaying.AUDIO_DEVICE_SAMPLING_RATE,
             target_sampling_rate=NowPlaying.SUPPORTED_SAMPLING_RATE_BY_MUSIC_DETECTION_MODEL
         )
-        is_music_detected = self._music_detection_service.is_music_detected(resampled_audio)
+        music_detection = self._music_detection_service.detect_music(resampled_audio)
 
-        # Build up a 10-second buffer by combining last two recordings
-        if self._audio_buffer is None:
-            self._audio_buffer = audio
-        else:
-            self._audio_buffer = np.concatenate((self._audio_buffer, audio))[
-                                 -NowPlaying.AUDIO_DEVICE_SAMPLING_RATE * 10:]
+        # Reuse the resampled audio for identification when the rates match, avoiding a second resample
+        if self._wav_encoder.sampling_rate == NowPlaying.SUPPORTED_SAMPLING_RATE_BY_MUSIC_DETECTION_MODEL:
+            return resampled_audio, NowPlaying.SUPPORTED_SAMPLING_RATE_BY_MUSIC_DETECTION_MODEL, music_detection
+        return audio, NowPlaying.AUDIO_DEVICE_SAMPLING_RATE, music_detection
 
-        return audio, is_music_detected
-
-    def _handle_music_detected(self, audio: np.ndarray) -> None:
-        song_info = self._trigger_song_identify(audio)
+    def _handle_music_detected(self, audio: np.ndarray, sampling_rate: int) -> None:
+        song_info = self._trigger_song_identify(audio, sampling_rate)
         self._no_music_counter = 0
+        self._state_manager.update_last_music_detected_time()
         self.stop_song_within_limit()
 
+        if song_info is None:
+            self._logger.debug("Music detected but no song identified, keeping current state.")
+            return
+
         if (self._state_manager.get_state().current != PlayState.PLAYING
                 or self._state_manager.music_still_playing_but_different_song_identified(song_info.title)):
             self._state_manager.set_playing_state(song_info.title, song_info.artist)
@@ -103,12 +146,8 @@ class NowPlaying:
                     self._spotify_service.pause_playback(device_id)
                     self._logger.debug(f"Song finishes within 10 seconds, pausing.")
 
-    def _trigger_song_identify(self, audio: np.ndarray) -> SongInfo:
-        int16_audio = AudioProcessingUtils.float32_to_int16(audio)
-        wav_audio = AudioProcessingUtils.to_wav(
-            int16_audio,
-            sampling_rate=NowPlaying.AUDIO_DEVICE_SAMPLING_RATE
-        )
+    def _trigger_song_identify(self, audio: np.ndarray, sampling_rate: int) -> Optional[SongInfo]:
+        wav_audio = self._wav_encoder.encode(audio, source_sampling_rate=sampling_rate)
         return self._song_identify_service.identify(wav_audio)
 
     def _handle_no_music_detected(self) -> None:
@@ -125,7 +164,6 @@ class NowPlaying:
                 if device_id:
                     self._spotify_service.pause_playback(device_id)
                 self._no_music_counter = 0
-        self._audio_buffer = None
 
         if (self._state_manager.get_state().current == PlayState.STOPPED and
                 self._state_manager.no_music_detected_for_more_than_a_minute()):
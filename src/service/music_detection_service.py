@@ -3,7 +3,8 @@ import logging
 
 import numpy as np
 from ai_edge_litert.interpreter import Interpreter
-from typing import List, Tuple, Final
+from enum import Enum
+from typing import List, Tuple, Final, Optional
 
 import sys
 
@@ -11,20 +12,44 @@ sys.path.append("..")
 from logger import Logger
 
 
+class MusicDetection(Enum):
+    NO_MUSIC = 0
+    MUSIC = 1
+    FADING = 2  # Below the detection threshold, but briefly held as music by the exit hysteresis
+
+
 class MusicDetectionService:
     SAMPLING_RATE: Final[int] = 16000
     CLASS_MAP_PATH: Final[str] = 'src/ml-model/yamnet_class_map.csv'
     MODEL_PATH: Final[str] = 'src/ml-model/1.tflite'
     CONFIDENCE_THRESHOLD: Final[float] = 0.2
-
-    def __init__(self, audio_duration_in_seconds: int) -> None:
+    EXIT_CONFIDENCE_THRESHOLD: Final[float] = 0.1
+    SMOOTHING_FACTOR: Final[float] = 0.6
+    ENTRY_WINDOWS: Final[int] = 2  # Consecutive windows above the threshold before music is detected
+    MAX_FADING_WINDOWS: Final[int] = 2  # Consecutive windows music can be held below the threshold
+    # First and last class of the contiguous AudioSet music block: genres, instruments and moods
+    MUSIC_CLASS_RANGE: Final[Tuple[str, str]] = ('Music', 'Scary music')
+    # Bells, tuning fork and chimes within that block, e.g. doorbells and bicycle bells, are not music
+    NON_MUSIC_CLASS_RANGE: Final[Tuple[str, str]] = ('Bell', 'Change ringing (campanology)')
+
+    def __init__(self, audio_duration_in_seconds: int, interpreter: Optional[Interpreter] = None) -> None:
         self._logger: logging.Logger = Logger().get_logger()
         self._audio_duration_in_seconds: int = audio_duration_in_seconds
 
-        self._interpreter: Interpreter = Interpreter(MusicDetectionService.MODEL_PATH)
+        self._interpreter: Interpreter = interpreter or Interpreter(MusicDetectionService.MODEL_PATH)
         self._configure_interpreter()
 
         self._class_names: List[str] = self._load_class_names()
+        self._music_class_index: int = self._class_names.index(MusicDetectionService.MUSIC_CLASS_RANGE[0]) \
+            if MusicDetectionService.MUSIC_CLASS_RANGE[0] in self._class_names else -1
+        self._music_class_mask: np.ndarray = self._get_music_class_mask()
+
+        # Music is entered after consecutive windows above the threshold, and held for a few windows below it
+        # while the score smoothed across windows stays above the exit threshold
+        self._smoothed_music_score: float = 0.0
+        self._is_music_playing: bool = False
+        self._windows_above_threshold: int = 0
+        self._fading_windows: int = 0
 
     def _configure_interpreter(self) -> None:
         self.input_details = self._interpreter.get_input_details()
@@ -49,26 +74,68 @@ class MusicDetectionService:
             self._logger.error(f"Class map file not found at {MusicDetectionService.CLASS_MAP_PATH}")
             return []
 
-    def _get_top_class(self, scores: np.ndarray) -> Tuple[str, float]:
-        mean_scores = scores.mean(axis=0)
-        top_index = mean_scores.argmax()
-        return self._class_names[top_index], mean_scores[top_index]
+    def _get_class_range(self, class_range: Tuple[str, str]) -> range:
+        first_class, last_class = class_range
+        return range(self._class_names.index(first_class), self._class_names.index(last_class) + 1)
 
-    def is_music_detected(self, waveform: np.ndarray) -> bool:
+    def _get_music_class_mask(self) -> np.ndarray:
+        try:
+            music_classes = self._get_class_range(MusicDetectionService.MUSIC_CLASS_RANGE)
+            non_music_classes = self._get_class_range(MusicDetectionService.NON_MUSIC_CLASS_RANGE)
+        except ValueError:
+            self._logger.error("Music classes not found in class map.")
+            return np.zeros(0, dtype=bool)
+        mask = np.zeros(len(self._class_names), dtype=bool)
+        mask[music_classes.start:music_classes.stop] = True
+        mask[non_music_classes.start:non_music_classes.stop] = False
+        return mask
+
+    def _get_music_score(self, scores: np.ndarray) -> float:
+        # The 'Music' score of each frame whose top class is any music class, averaged over the window
+        is_music_frame = self._music_class_mask[scores.argmax(axis=1)]
+        return float(np.mean(scores[:, self._music_class_index] * is_music_frame))
+
+    def detect_music(self, waveform: np.ndarray) -> MusicDetection:
         if not self._class_names:
             self._logger.error("Class names are not loaded. Cannot perform detection.")
-            return False
+            return MusicDetection.NO_MUSIC
+
+        if not self._music_class_mask.size:
+            self._logger.error("Music classes are not available. Cannot perform detection.")
+            return MusicDetection.NO_MUSIC
 
         self._interpreter.set_tensor(self.waveform_input_index, waveform)
         self._interpreter.invoke()
 
         scores = self._interpreter.get_tensor(self.scores_output_index)
 
-        top_class, confidence = self._get_top_class(scores)
-
-        if top_class == 'Music' and confidence > MusicDetectionService.CONFIDENCE_THRESHOLD:
-            self._logger.info(f"Music detected with confidence: {confidence:.2f}")
-            return True
-
+        music_score = self._get_music_score(scores)
+
+        if not self._is_music_playing:
+            self._windows_above_threshold = self._windows_above_threshold + 1 \
+                if music_score > MusicDetectionService.CONFIDENCE_THRESHOLD else 0
+            if self._windows_above_threshold < MusicDetectionService.ENTRY_WINDOWS:
+                self._logger.debug(f"No music detected, confidence: {music_score:.2f}.")
+                return MusicDetection.NO_MUSIC
+            self._is_music_playing = True
+            self._smoothed_music_score = music_score
+        else:
+            self._smoothed_music_score = (MusicDetectionService.SMOOTHING_FACTOR * music_score
+                                          + (1 - MusicDetectionService.SMOOTHING_FACTOR) * self._smoothed_music_score)
+
+        if music_score > MusicDetectionService.CONFIDENCE_THRESHOLD:
+            self._fading_windows = 0
+            self._logger.info(f"Music detected with confidence: {music_score:.2f}")
+            return MusicDetection.MUSIC
+
+        if (self._smoothed_music_score > MusicDetectionService.EXIT_CONFIDENCE_THRESHOLD
+                and self._fading_windows < MusicDetectionService.MAX_FADING_WINDOWS):
+            self._fading_windows += 1
+            self._logger.debug(f"Music fading with smoothed confidence: {self._smoothed_music_score:.2f}")
+            return MusicDetection.FADING
+
+        self._is_music_playing = False
+        self._windows_above_threshold = 0
+        self._fading_windows = 0
         self._logger.debug("No music detected.")
-        return False
+        return MusicDetection.NO_MUSIC
@@ -1,6 +1,6 @@
 import asyncio
 import logging
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Union
 import io
 from shazamio import Shazam
 from dataclasses import dataclass
@@ -22,10 +22,14 @@ class SongIdentifyService:
     def __init__(self) -> None:
         self._logger: logging.Logger = Logger().get_logger()
         self._shazam: Shazam = Shazam()
+        # A single event loop is reused for every lookup, rather than creating and tearing one down per call
+        self._event_loop: asyncio.AbstractEventLoop = asyncio.new_event_loop()
 
-    def identify(self, audio_wav_buffer: io.BytesIO) -> Optional[SongInfo]:
+    def identify(self, audio_wav_buffer: Union[io.BytesIO, bytearray]) -> Optional[SongInfo]:
         try:
-            result = asyncio.run(self._shazam.recognize(audio_wav_buffer.read()))
+            # Shazam accepts a bytearray directly, so a preallocated WAV buffer is passed without copying
+            audio_wav = audio_wav_buffer.read() if isinstance(audio_wav_buffer, io.BytesIO) else audio_wav_buffer
+            result = self._event_loop.run_until_complete(self._shazam.recognize(audio_wav))
             if not result or "track" not in result:
                 self._logger.info("No song identified in the provided audio buffer.")
                 return None
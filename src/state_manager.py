@@ -1,7 +1,7 @@
 import datetime
 import logging
 from enum import Enum
-from typing import Optional
+from typing import Optional, Callable
 from dataclasses import dataclass
 
 from logger import Logger
@@ -31,8 +31,9 @@ class AppState:
 
 
 class StateManager:
-    def __init__(self):
+    def __init__(self, clock: Callable[[], datetime.datetime] = datetime.datetime.now):
         self._logger: logging.Logger = Logger().get_logger()
+        self._clock: Callable[[], datetime.datetime] = clock
         self._state: AppState = AppState()
         self._last_music_detected_time: Optional[datetime.datetime] = None
 
@@ -59,12 +60,12 @@ class StateManager:
         self._set_state(PlayState.STOPPED, None)
 
     def update_last_music_detected_time(self) -> None:
-        self._last_music_detected_time = datetime.datetime.now()
+        self._last_music_detected_time = self._clock()
 
     def no_music_detected_for_more_than_a_minute(self) -> bool:
         if self._last_music_detected_time is None:
             return True
-        elapsed_time = datetime.datetime.now() - self._last_music_detected_time
+        elapsed_time = self._clock() - self._last_music_detected_time
         if elapsed_time >= datetime.timedelta(minutes=1):
             self._logger.info("No music detected for more than a minute.")
             return True